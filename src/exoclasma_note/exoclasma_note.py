@@ -1,33 +1,53 @@
+from __future__ import annotations
+
 __version__ = "0.9.0"
 
 from contextlib import contextmanager
 from copy import deepcopy as dc
 from glob import glob
 from multiprocessing import cpu_count, Pool
-from pandarallel import pandarallel #
 from typing import Union
 import argparse
+import atexit
 import bz2
+import concurrent.futures
 import base64
 import datetime
 import functools
 import glob
 import gzip
+import importlib.util
 import io
-import json
 import logging
+import logging.handlers
 import math
-import numpy #
+import multiprocessing
+import orjson #
 import os
-import pandas #
+import queue
 import re
+import shutil
 import subprocess
 import sys
-import tabix #
 import tempfile
 import time
 import warnings
 
+## ------======| LAZY IMPORTS |======------
+
+def LazyImport(Name: str):
+	# Heavy modules load on first attribute access, so the CLI starts fast
+	if Name in sys.modules: return sys.modules[Name]
+	Spec = importlib.util.find_spec(Name)
+	Spec.loader = importlib.util.LazyLoader(Spec.loader)
+	Module = importlib.util.module_from_spec(Spec)
+	sys.modules[Name] = Module
+	Spec.loader.exec_module(Module)
+	return Module
+
+numpy = LazyImport("numpy") #
+pandas = LazyImport("pandas") #
+
 ## ------======| LOGGING |======------
 
 def DefaultLogger(
@@ -39,21 +59,35 @@ def DefaultLogger(
 	
 	# Compose logger
 	Logger = logging.getLogger("default_logger")
+	if getattr(DefaultLogger, "LogFileName", None) == LogFileName: return Logger
 	logging.basicConfig(level=Level, format=Formatter)
 	
-	# Add log file
-	Logger.handlers = []
+	# Stop previous listener
+	if getattr(DefaultLogger, "Listener", None) is not None:
+		DefaultLogger.Listener.stop()
+		for Handler in DefaultLogger.Listener.handlers: Handler.close()
+	else: atexit.register(lambda: DefaultLogger.Listener.stop())
+	
+	# Add log file behind a queue, so threads don't wait for the file lock
 	LogFile = logging.FileHandler(LogFileName)
 	LogFile.setLevel(Level)
 	LogFile.setFormatter(logging.Formatter(Formatter))
-	Logger.addHandler(LogFile)
+	LogQueue = queue.SimpleQueue()
+	Logger.handlers = [logging.handlers.QueueHandler(LogQueue)]
+	DefaultLogger.Listener = logging.handlers.QueueListener(LogQueue, LogFile, respect_handler_level=True)
+	DefaultLogger.Listener.start()
+	DefaultLogger.LogFileName = LogFileName
 	
 	# Return
 	return Logger
 
 ## ------======| I/O |======------
 
-def SaveJSON(Data: list, FileName: str) -> None: json.dump(Data, open(FileName, 'w'), indent=4, ensure_ascii=False)
+def SaveJSON(Data: list, FileName: str) -> None:
+	with open(FileName, 'wb') as O: O.write(orjson.dumps(Data, option=orjson.OPT_INDENT_2))
+
+def LoadJSON(FileName: str) -> Union[dict, list]:
+	with open(FileName, 'rb') as I: return orjson.loads(I.read())
 
 def GzipCheck(FileName: str) -> bool: return open(FileName, 'rb').read(2).hex() == "1f8b"
 
@@ -72,6 +106,149 @@ def OpenAnyway(FileName: str,
 		Logger.error(ErrorMessage)
 		raise OSError(ErrorMessage)
 
+def ReadTsvChunks(
+		FileName: str,
+		Columns: list,
+		ChunkSize: int,
+		BlockSize: int = 8 << 20):
+	
+	import pyarrow.csv #
+	
+	# Only the requested columns are parsed, all of them as strings
+	with open(FileName, 'rt') as I: Header = I.readline().rstrip('\n').split('\t')
+	Columns = [item for item in Header if item in set(Columns)]
+	Reader = pyarrow.csv.open_csv(
+		FileName,
+		read_options = pyarrow.csv.ReadOptions(use_threads=True, block_size=BlockSize),
+		parse_options = pyarrow.csv.ParseOptions(delimiter='\t'),
+		convert_options = pyarrow.csv.ConvertOptions(include_columns=Columns, column_types={item: pyarrow.string() for item in Columns}, strings_can_be_null=True))
+	
+	# Regroup record batches into chunks of ChunkSize rows
+	Batches, Rows, Offset = [], 0, 0
+	for Batch in Reader:
+		Batches.append(Batch)
+		Rows += Batch.num_rows
+		while Rows >= ChunkSize:
+			Table = pyarrow.Table.from_batches(Batches)
+			Data = Table.slice(0, ChunkSize).to_pandas().set_axis(pandas.RangeIndex(Offset, Offset + ChunkSize), axis=0)
+			Batches, Rows, Offset = Table.slice(ChunkSize).to_batches(), Rows - ChunkSize, Offset + ChunkSize
+			yield Data
+	if Rows > 0: yield pyarrow.Table.from_batches(Batches).to_pandas().set_axis(pandas.RangeIndex(Offset, Offset + Rows), axis=0)
+
+def StringSchema(Columns: list) -> pyarrow.Schema:
+	import pyarrow #
+	return pyarrow.schema([(str(item), pyarrow.string()) for item in Columns])
+
+def Tsv2Parquet(
+		FileName: str,
+		BlockSize: int = 8 << 20) -> None:
+	
+	import pyarrow.csv #
+	import pyarrow.parquet #
+	
+	# Parquet sidecar (FileName.parquet) with every column as string
+	with open(FileName, 'rt') as I: Header = I.readline().rstrip('\n').split('\t')
+	Reader = pyarrow.csv.open_csv(
+		FileName,
+		read_options = pyarrow.csv.ReadOptions(use_threads=True, block_size=BlockSize),
+		parse_options = pyarrow.csv.ParseOptions(delimiter='\t'),
+		convert_options = pyarrow.csv.ConvertOptions(column_types={item: pyarrow.string() for item in Header}, strings_can_be_null=True))
+	with pyarrow.parquet.ParquetWriter(f"{FileName}.parquet.tmp", Reader.schema, compression='zstd') as Writer:
+		for Batch in Reader: Writer.write_batch(Batch)
+	os.replace(f"{FileName}.parquet.tmp", f"{FileName}.parquet")
+
+def ReadTableChunks(
+		FileName: str,
+		Columns: list,
+		ChunkSize: int):
+	
+	# Prefer the Parquet sidecar if it is not older than the TSV
+	Sidecar = f"{FileName}.parquet"
+	if not (os.path.isfile(Sidecar) and (os.path.getmtime(Sidecar) >= os.path.getmtime(FileName))):
+		yield from ReadTsvChunks(FileName, Columns, ChunkSize)
+		return
+	import pyarrow.parquet #
+	Parquet = pyarrow.parquet.ParquetFile(Sidecar)
+	Offset = 0
+	for Batch in Parquet.iter_batches(batch_size=ChunkSize, columns=[item for item in Parquet.schema_arrow.names if item in set(Columns)]):
+		yield Batch.to_pandas().set_axis(pandas.RangeIndex(Offset, Offset + Batch.num_rows), axis=0)
+		Offset += Batch.num_rows
+
+@functools.lru_cache(maxsize=None)
+def LoadConfig(Name: str) -> dict:
+	return LoadJSON(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', Name))
+
+def SaveUnit(Unit: dict, UnitsFile: str, Compact: bool = False) -> None:
+	# One buffered write to a temp file, then an atomic rename over the units file.
+	# Checkpoints are compact, the final write is indented for humans
+	with open(f"{UnitsFile}.tmp", 'wb', buffering=1 << 20) as O: O.write(orjson.dumps(Unit) if Compact else orjson.dumps(Unit, option=orjson.OPT_INDENT_2))
+	os.replace(f"{UnitsFile}.tmp", UnitsFile)
+	# The units file now holds every logged stage. Dropping the log keeps stages
+	# removed from the units file by hand (to rerun them) from being replayed
+	if os.path.isfile(f"{UnitsFile}.progress.jsonl"): os.remove(f"{UnitsFile}.progress.jsonl")
+
+def LogStage(Unit: dict, StageAlias: str, UnitsFile: str) -> None:
+	# Stage completion is one appended line in UnitsFile.progress.jsonl, not a units file rewrite
+	with open(f"{UnitsFile}.progress.jsonl", 'ab') as O: O.write(orjson.dumps({"Unit": Unit["ID"], "Stage": StageAlias, "Time": time.time()}) + b'\n')
+	Unit['Stage'].append(StageAlias)
+
+def ReplayStages(Unit: dict, UnitsFile: str) -> None:
+	if not os.path.isfile(f"{UnitsFile}.progress.jsonl"): return
+	with open(f"{UnitsFile}.progress.jsonl", 'rb') as I: Records = [orjson.loads(line) for line in I if line.strip()]
+	Done = set(Unit['Stage'])
+	for Record in Records:
+		if (Record["Unit"] == Unit["ID"]) and (Record["Stage"] not in Done):
+			Unit['Stage'].append(Record["Stage"])
+			Done.add(Record["Stage"])
+
+@contextmanager
+def UnitsFileWriter(UnitsFile: str) -> dict:
+	
+	# Stages mutate the unit in memory; it is written once on exit, even on error.
+	# Stages finished by a run that died before that write are replayed from the progress log
+	Unit = LoadJSON(UnitsFile)
+	ReplayStages(Unit, UnitsFile)
+	try:
+		yield Unit
+	finally:
+		SaveUnit(Unit, UnitsFile)
+
+def HyperlinkFormula(URL: str, Text: str) -> str: return "=HYPERLINK(\"{}\", \"{}\")".format(URL.replace('"', '""'), Text.replace('"', '""'))
+
+def SaveXLSX(
+		FileName: str,
+		Sheets: dict,
+		BlockSize: int = 4096) -> None:
+	
+	# Sheets: {Name: (Data, {Column: URLs})}. Rows are streamed to disk (constant_memory),
+	# so every row is written completely, links included, before the next one.
+	# Cells are converted to Python objects one block of rows at a time into a reused buffer,
+	# so memory stays O(BlockSize x columns) however long the sheet is.
+	# xlsxwriter keeps at most 65530 URLs per sheet and drops the rest
+	MaxURLs = 65530
+	with pandas.ExcelWriter(FileName, engine='xlsxwriter', engine_kwargs={'options': {'constant_memory': True, 'strings_to_formulas': False, 'strings_to_urls': False}}) as Writer:
+		Bold = Writer.book.add_format({'bold': True})
+		for Name, (Data, Links) in Sheets.items():
+			Sheet = Writer.book.add_worksheet(Name)
+			Sheet.write_row(0, 0, [str(item) for item in Data.columns], Bold)
+			LinkCols = [(Data.columns.get_loc(Col), URLs.reindex(Data.index).to_numpy(dtype=object)) for Col, URLs in Links.items() if Col in Data.columns]
+			Buffer = numpy.empty((min(BlockSize, len(Data)), Data.shape[1]), dtype=object)
+			LinkCount = 0
+			for Start in range(0, len(Data), BlockSize):
+				Block = Data.iloc[Start:Start + BlockSize]
+				Values = Buffer[:len(Block)]
+				for Col in range(Block.shape[1]):
+					Column = Block.iloc[:, Col]
+					Values[:, Col] = Column.astype(object).where(Column.notna(), None).to_numpy()
+				for num, Row in enumerate(Values, Start):
+					Sheet.write_row(num + 1, 0, Row)
+					for Col, URLs in LinkCols:
+						if not isinstance(URLs[num], str): continue
+						# Past the per-sheet URL limit links become HYPERLINK formulas, as before write_url
+						if LinkCount < MaxURLs: Sheet.write_url(num + 1, Col, URLs[num], string=str(Row[Col]))
+						else: Sheet.write_formula(num + 1, Col, HyperlinkFormula(URLs[num], str(Row[Col])), None, str(Row[Col]))
+						LinkCount += 1
+
 def GenerateFileNames(
 		Unit: dict,
 		Options: dict) -> dict:
@@ -182,6 +359,7 @@ def ANNOVAR(
 		GenomeAssembly: str,
 		Databases: list = [],
 		GFF3List: list = [],
+		Sidecar: bool = False,
 		Threads: int = cpu_count()) -> None:
 	
 	MODULE_NAME = "ANNOVAR"
@@ -191,7 +369,8 @@ def ANNOVAR(
 	# Logging
 	for line in [f"Input VCF: {InputVCF}", f"Output TSV: {OutputTSV}", f"Genome Assembly: {GenomeAssembly}", f"Databases Dir: {DBFolder}"] + ([] if not Databases else [f"Databases: {'; '.join([(item['Protocol'] + '[' + item['Operation'] + ']') for item in Databases])}"]) + ([] if not GFF3List else [f"Databases: GFF3, {len(GFF3List)} items [r]"]): logging.info(line)
 	
-	with tempfile.TemporaryDirectory() as TempDir:
+	# Temp dir next to the output, so the final mv is a rename on the same filesystem
+	with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(OutputTSV))) as TempDir:
 		
 		# Options
 		TableAnnovarPath = os.path.join(AnnovarFolder, "table_annovar.pl")
@@ -210,8 +389,11 @@ def ANNOVAR(
 			Command = f"perl \"{TableAnnovarPath}\" \"{TempVCF}\" \"{DBFolder}\" --buildver {GenomeAssembly} --protocol {Protocol} --operation {Operation} {GFFs} --remove --vcfinput --thread {Threads}",
 			AllowedCodes = [25])
 		SimpleSubprocess(
-			Name = f"{MODULE_NAME}.CopyTSV",
-			Command = f"cp \"{AnnotatedTXT}\" \"{OutputTSV}\"")
+			Name = f"{MODULE_NAME}.MoveTSV",
+			Command = f"mv \"{AnnotatedTXT}\" \"{OutputTSV}\"")
+	
+	# Parquet sidecar for AnnoFit
+	if Sidecar: Tsv2Parquet(OutputTSV)
 
 # ------======| CUSTOM REGION-BASED ANNOTATIONS |======------
 
@@ -227,8 +409,6 @@ def Tsv2Gff3(
 	
 	MODULE_NAME = "Tsv2Gff3"
 	
-	pandarallel.initialize(nb_workers=Threads, verbose=1)
-	
 	# Logging
 	for line in [f"Name: {dbName}", f"Input TSV db: {InputTSV}", f"Output GFF3: {OutputGFF3}"]: logging.info(line)
 	
@@ -247,7 +427,7 @@ def Tsv2Gff3(
 	# Filter & sort intervals by reference
 	Filtered = [item for item in list(set(Data[ChromCol].to_list())) if item not in Chroms.keys()]
 	if Filtered: logging.warning(f"Contigs will be removed from database \"{dbName}\": {', '.join(sorted(Filtered))}")
-	Data = Data[Data[ChromCol].parallel_apply(lambda x: x in Chroms.keys())]
+	Data = Data[Data[ChromCol].isin(list(Chroms.keys()))]
 	Data["Rank"] = Data[ChromCol].map(Chroms)
 	Data.sort_values(["Rank", StartCol], inplace=True)
 	if Data.shape[0] == 0:
@@ -255,10 +435,11 @@ def Tsv2Gff3(
 		logging.error(ErrorMessage)
 		raise RuntimeError(ErrorMessage)
 	
-	# Processing
-	Attributes = Data[AttributeCols].parallel_apply(lambda x: "ID=" + base64.b16encode(json.dumps(x.to_dict()).encode('utf-8')).decode('utf-8'), axis=1)
+	# Processing. Databases without attribute columns get an empty record per row
+	Records = Data[AttributeCols].to_dict(orient='records') if AttributeCols else [{}] * Data.shape[0]
+	Attributes = numpy.array([("ID=" + base64.urlsafe_b64encode(orjson.dumps(Record, option=orjson.OPT_SERIALIZE_NUMPY)).rstrip(b'=').decode('ascii')) for Record in Records], dtype=object)
 	Data.drop(columns=AttributeCols, inplace=True)
-	Data[StartCol] = Data[StartCol].parallel_apply(lambda x: 1 if x == 0 else x)
+	Data[StartCol] = Data[StartCol].mask(Data[StartCol] == 0, 1)
 	Data = Data.assign(sample=dbName, type="region", attributes=Attributes,	score=".", strand=".", phase=".")[DataOrder]
 	
 	# Save
@@ -271,6 +452,10 @@ def Tsv2Gff3(
 	# Return expected cols
 	return [f"{str(dbName)}.{str(item)}" for item in AttributeCols] if AttributeCols else [ str(dbName) ]
 
+def DecodeGff3Hit(Value: str) -> dict: return orjson.loads(base64.urlsafe_b64decode(Value + '=' * (-len(Value) % 4)))
+
+def JoinGff3Values(Series: pandas.Series) -> str: return '; '.join([str(item) for item in sorted(list(set(Series.to_list())))])
+
 def CureBase(
 		InputVCF: str,
 		OutputTSV: str,
@@ -279,12 +464,12 @@ def CureBase(
 		GenomeAssembly: str,
 		Reference: str,
 		DBDir: str,
+		ChunkSize: int,
 		Threads: int) -> None:
 	
-	MODULE_NAME = "CureBase"
+	import pyarrow.parquet #
 	
-	# Initialize Pandarallel
-	pandarallel.initialize(nb_workers=Threads, verbose=1)
+	MODULE_NAME = "CureBase"
 	
 	with tempfile.TemporaryDirectory() as TempDir:
 		
@@ -317,27 +502,268 @@ def CureBase(
 		Data = pandas.read_csv(TempTSV, sep='\t', dtype=str)
 		NewColumns = {f"gff3{'' if index == 0 else str(index + 1)}": item["Name"] for index, item in enumerate(Databases)}
 		Data = Data[SNPdata + list(NewColumns.keys())]
-		Data[list(NewColumns.keys())] = Data[list(NewColumns.keys())].parallel_applymap(lambda x: '.' if x == '.' else [json.loads(base64.b16decode(item.encode('utf-8')).decode('utf-8')) for item in x.split("=")[1].split(",")])
-		for Col in list(NewColumns.keys()):
-			NewCols = Data[Col][Data[Col] != '.']
-			if NewCols.size > 0:
-				NewCols = NewCols.parallel_apply(lambda LD: pandas.Series({str(NewColumns[Col]): ["yes"]} if not LD[0] else {f"{str(NewColumns[Col])}.{str(k)}": [dic[k] for dic in LD] for k in LD[0]}))
-				Data = pandas.concat([Data, NewCols], axis=1)
-			else: logging.warning(f"Database has no intersections with variants: {str(NewColumns[Col])}")
-		Data = Data.drop(columns=list(NewColumns.keys()))
-		MissingCols = [item for item in ExpectedCols if item not in Data.columns.to_list()]
-		Data[MissingCols] = float("nan")
-		InformationCols = [item for item in Data.columns.to_list() if item not in SNPdata]
-		Data[InformationCols] = Data[InformationCols].parallel_applymap(lambda x: '.' if x != x else '; '.join([str(item) for item in sorted(list(set(x)))]))
-		Data = Data[SNPdata + ExpectedCols]
+		Blocks = []
+		for Col, Name in NewColumns.items():
+			# One row per hit: "ID=hit1,hit2" -> hit1, hit2
+			Hits = Data[Col][Data[Col] != '.'].str.split("=").str[1].str.split(",").explode()
+			if Hits.size == 0:
+				logging.warning(f"Database has no intersections with variants: {str(Name)}")
+				continue
+			Hits = pandas.DataFrame([DecodeGff3Hit(item) for item in Hits.to_numpy()], index=Hits.index, dtype=object)
+			Hits = Hits.rename(columns=lambda x: f"{str(Name)}.{str(x)}") if Hits.shape[1] > 0 else pandas.DataFrame({str(Name): "yes"}, index=Hits.index)
+			Blocks.append(Hits.groupby(level=0).agg(JoinGff3Values))
+		Data = pandas.concat([Data[SNPdata]] + Blocks, axis=1).reindex(columns=SNPdata + ExpectedCols)
+		Data[ExpectedCols] = Data[ExpectedCols].fillna('.')
 		
-		# Merge Annovar & Gff3
-		AnnovarTable = pandas.read_csv(OutputTSV, sep='\t', dtype=str)
-		Data = pandas.merge(AnnovarTable, Data, how='left', on=['Chr', 'Start', 'End', 'Ref', 'Alt']).sort_values(by=['Chr', 'Start'])
-		Data.to_csv(OutputTSV, sep='\t', index=False)
+		# Merge Annovar & Gff3 chunk by chunk, keeping ANNOVAR row order; the Parquet sidecar is written alongside.
+		# Both go to temp files next to the output, so putting them in place is a rename
+		MergedTSV, MergedParquet = f"{OutputTSV}.tmp", f"{OutputTSV}.parquet.tmp"
+		Writer = None
+		with open(MergedTSV, 'wt') as O:
+			for ChunkNum, AnnovarTable in enumerate(pandas.read_csv(OutputTSV, sep='\t', dtype=str, chunksize=ChunkSize)):
+				AnnovarTable = pandas.merge(AnnovarTable, Data, how='left', on=SNPdata)
+				AnnovarTable.to_csv(O, sep='\t', index=False, header=(ChunkNum == 0))
+				if Writer is None: Writer = pyarrow.parquet.ParquetWriter(MergedParquet, StringSchema(AnnovarTable.columns), compression='zstd')
+				Writer.write_table(pyarrow.Table.from_pandas(AnnovarTable, schema=Writer.schema, preserve_index=False))
+		if Writer is not None:
+			Writer.close()
+			os.replace(MergedParquet, f"{OutputTSV}.parquet")
+		os.replace(MergedTSV, OutputTSV)
 
 # ------======| ANNOFIT |======------
 
+def FormatGenesOrFunction(Data: pandas.DataFrame) -> pandas.Series:
+	# Sorted unique ';'-tokens of all informative cells in a row
+	Cells = Data.stack()
+	Tokens = Cells[Cells.notna() & (Cells != '.')].astype(str).str.split(';').explode().droplevel(-1)
+	Tokens = Tokens.rename_axis("Row").reset_index(name="Token").drop_duplicates().sort_values("Token")
+	return Tokens.groupby("Row", sort=False)["Token"].agg(';'.join).reindex(Data.index, fill_value='.')
+
+def FormatDetails(Data: pandas.DataFrame) -> pandas.Series:
+	Cells = Data.stack()
+	Cells = Cells[Cells.notna() & (Cells != '.')].astype(str)
+	return Cells.groupby(level=0, sort=False).agg(';'.join).reindex(Data.index, fill_value='.')
+
+IntPattern = r'[+-]?\d+'
+
+FloatPattern = r'(?i)[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?|inf|nan)'
+
+def AnyTokenAtLeast(Series: pandas.Series, Sep: str, Pattern: str, Threshold: float) -> pandas.Series:
+	# False if any token is not a number, else whether any token reaches Threshold
+	Items = Series.astype(str).str.split(Sep).explode().str.strip()
+	Valid = Items.str.fullmatch(Pattern).astype(bool)
+	Values = pandas.to_numeric(Items.where(Valid), errors='coerce')
+	return ((Values >= Threshold).groupby(level=0).any() & Valid.groupby(level=0).all()).reindex(Series.index)
+
+def FilterpLi(Series: pandas.Series) -> pandas.Series: return AnyTokenAtLeast(Series, ';', FloatPattern, 0.9)
+
+def FilterDepth(Series: pandas.Series) -> pandas.Series: return AnyTokenAtLeast(Series, ',', IntPattern, 4)
+
+def FilterExonPrediction(Series: pandas.Series, Threshold: int) -> pandas.Series: return AnyTokenAtLeast(Series.astype(str).str.split('/').str[0], '/', IntPattern, Threshold)
+
+# Prepare func
+def TokenPattern(Items: list, Sep: str) -> re.Pattern:
+	if not Items: return re.compile("(?!)")
+	return re.compile(f"(?:^|{re.escape(Sep)})(?:{'|'.join([re.escape(str(item)) for item in Items])})(?:{re.escape(Sep)}|$)")
+
+def ContainsPattern(Series: pandas.Series, Pattern: re.Pattern) -> pandas.Series:
+	if not isinstance(Series.dtype, pandas.CategoricalDtype): return Series.astype(str).str.contains(Pattern, na=False)
+	# Match categories once, then look up by code (code -1 is NA)
+	Matches = numpy.append(numpy.asarray(Series.cat.categories.astype(str).str.contains(Pattern), dtype=bool), False)
+	return pandas.Series(Matches[Series.cat.codes.to_numpy()], index=Series.index)
+
+def SqueezeXRef(GeneNames: pandas.Series, XRefTable: pandas.DataFrame) -> pandas.DataFrame:
+	Genes = GeneNames.str.split(';').explode().to_frame("#Gene")
+	XRef = Genes.join(XRefTable, on="#Gene", how='inner').drop(columns="#Gene").melt(var_name="Column", value_name="Value", ignore_index=False)
+	XRef = XRef[XRef["Value"].notna() & (XRef["Value"] != '.')].sort_values("Value")
+	return XRef.groupby([XRef.index, "Column"], sort=False)["Value"].agg(';'.join).unstack().reindex(index=GeneNames.index, columns=XRefTable.columns)
+
+# Format func
+def FormatCoordinates(Series: pandas.Series) -> pandas.Series: return pandas.to_numeric(Series, errors='coerce').astype('Int64')
+
+def FormatPopulationFreq(Data: Union[pandas.Series, pandas.DataFrame]) -> Union[pandas.Series, pandas.DataFrame]: return (pandas.to_numeric(Data, errors='coerce') if isinstance(Data, pandas.Series) else Data.apply(pandas.to_numeric, errors='coerce')).fillna(-1.0).astype('float64')
+
+def FormatVcfMetadata(Data: pandas.DataFrame) -> pandas.DataFrame:
+	Blocks = []
+	for Format, Block in Data.groupby("VCF.FORMAT", sort=False):
+		Header = [f"VCF.{item}" for item in str(Format).split(":")]
+		Block = Block["VCF.SAMPLE"].astype(str)
+		Block = Block[Block.str.count(":") == len(Header) - 1]
+		if Block.empty: continue
+		Block = Block.str.split(":", expand=True)
+		Block.columns = Header
+		Blocks.append(Block)
+	return (pandas.concat(Blocks, axis=0, sort=False) if Blocks else pandas.DataFrame()).reindex(Data.index)
+
+def FormatGenotype(Series: pandas.Series) -> numpy.ndarray:
+	Alleles = Series.str.extract(r'^\s*([+-]?\d+)\s*/\s*([+-]?\d+)\s*$').apply(pandas.to_numeric)
+	return numpy.where(Alleles.isna().any(axis=1), '.', numpy.where((Alleles[0] == Alleles[1]) & (Alleles[0] != 0), 'HOMO', Series))
+
+def FormatGIAB(Data: pandas.DataFrame, Context: dict) -> numpy.ndarray:
+	Result = (Data[Context["GIABCols"]] != '.').dot(Context["GIABNames"]).str[:-1]
+	return numpy.where(Result == '', '.', Result)
+
+def FormatNCBIProblems(Data: pandas.DataFrame, Context: dict) -> numpy.ndarray:
+	Result = numpy.full(Data.shape[0], '.', dtype=object)
+	for Col in Context["NCBICols"]: Result = numpy.where(Data[Col] != '.', Col[5:-6], Result)
+	return Result
+
+# Vectorized prediction func (codes: 0 = U, 1 = D, 2 = T)
+PredictionCategories = ["U", "D", "T"]
+
+PredictionCodes = {"U": 0, "D": 1, "T": 2}
+
+def Categorize(Values: numpy.ndarray, Damaging: numpy.ndarray) -> numpy.ndarray: return numpy.where(numpy.isnan(Values), 0, numpy.where(Damaging, 1, 2)).astype(numpy.int8)
+
+def CountRatio(Codes: numpy.ndarray) -> numpy.ndarray:
+	Damaging = (Codes == 1).sum(axis=1)
+	Known = Damaging + (Codes == 2).sum(axis=1)
+	return numpy.where(Known == 0, '.', pandas.Series(Damaging).astype(str).to_numpy(dtype=object) + '/' + pandas.Series(Known).astype(str).to_numpy(dtype=object))
+
+def FormatPredictions(Data: pandas.DataFrame, Context: dict) -> dict:
+	Scores = Data[Context["ScoreCols"]].apply(pandas.to_numeric, errors='coerce').to_numpy(dtype=numpy.float64)
+	Splice = Scores[:, 2:2 + Context["SpliceCount"]]
+	Conservation = Scores[:, 2 + Context["SpliceCount"]:]
+	Codes = numpy.empty((Data.shape[0], len(Context["SymbolCodes"]) + 2), dtype=numpy.int8)
+	for num, (Col, Symbols) in enumerate(Context["SymbolCodes"].items()): Codes[:, num] = Data[Col].map(Symbols).fillna(0).to_numpy(dtype=numpy.int8)
+	Codes[:, -2] = Categorize(Scores[:, 0], Scores[:, 0] <= 0.5) # REVEL
+	Codes[:, -1] = Categorize(Scores[:, 1], Scores[:, 1] >= 0.9) # MutPred
+	Categories = numpy.array(PredictionCategories, dtype=object)
+	Result = {Col: Categories[Codes[:, num]] for num, Col in enumerate(Context["SymbolPredCols"])}
+	Result["AnnoFit.ExonPred"] = CountRatio(Codes)
+	Result["AnnoFit.SplicePred"] = numpy.where(numpy.isnan(Splice).any(axis=1), '.', numpy.where((Splice > 0.6).any(axis=1), 'D', 'T'))
+	Result["AnnoFit.Conservation"] = CountRatio(Categorize(Conservation, Conservation >= 0.7))
+	return Result
+
+# Cached read-only tables, shared by every unit processed in this process
+@functools.lru_cache(maxsize=8)
+def LoadHGMD(FileName: str) -> pandas.DataFrame:
+	HGMDTable = pandas.read_csv(FileName, sep='\t', dtype=str)
+	for Col in ['Chromosome/scaffold position start (bp)', 'Chromosome/scaffold position end (bp)']: HGMDTable[Col] = FormatCoordinates(HGMDTable[Col])
+	return HGMDTable.set_index(["Chromosome/scaffold name", "Chromosome/scaffold position start (bp)", "Chromosome/scaffold position end (bp)"]).sort_index().rename(columns={"Variant name": "HGMD"})
+
+@functools.lru_cache(maxsize=8)
+def LoadXRef(AnnovarFolder: str) -> pandas.DataFrame: return pandas.read_csv(os.path.join(AnnovarFolder, "example/gene_fullxref.txt"), sep='\t', dtype=str).set_index("#Gene_name").rename_axis(None, axis=1)
+
+def AnnoFitContext(
+		Config: dict,
+		HGMD: str,
+		AnnovarFolder: str) -> dict:
+	
+	# Config invariants
+	SymbolCols = [item["Name"] for item in Config["SymbolPred"]]
+	Context = {
+		"Config": Config,
+		"WipePattern": TokenPattern(Config["IntergeneSynonims"], ';'),
+		"TokenFilters": {
+			"CLINVAR": ("CLNSIG", TokenPattern(Config["CLINVAR_filter"], ',')),
+			"ExonicFunc": ("AnnoFit.ExonicFunc", TokenPattern(Config["ExonicFunc_filter"], ';')),
+			"ncRNA": ("AnnoFit.Func", TokenPattern(Config["ncRNA_filter"], ';')),
+			"Splicing": ("AnnoFit.Func", TokenPattern(Config["Splicing_filter"], ';'))
+		},
+		"SymbolPredCols": SymbolCols + ["REVEL", "MutPred_rankscore"],
+		"SymbolCodes": {item["Name"]: {key: PredictionCodes[value] for key, value in item["Symbols"].items()} for item in Config["SymbolPred"]},
+		"ScoreCols": ["REVEL", "MutPred_rankscore"] + Config["dbscSNV"] + Config["ConservationRS"],
+		"SpliceCount": len(Config["dbscSNV"]),
+		"GIABCols": sorted(Config["GIAB"], key=lambda x: x[5:]),
+		"NCBICols": sorted([item for item in Config["NCBI_Problems"] if item[-6:] == '.start'], key=lambda x: Config["NCBI_Problems_Ranks"][x[5:-6]]),
+		"ProblemSets": {Col: frozenset(Items) for Col, Items in Config["Problems"].items()},
+		"CategoryCols": ["CLNSIG", "InterVar_automated", "regsnp_disease", "AnnoFit.ExonicFunc", "AnnoFit.Func"],
+		"FilterSets": {Col: frozenset(Config[Key]) for Col, Key in [("AnnoFit.SplicePred", "SplicePred_filter"), ("regsnp_disease", "IntronPred_filter"), ("InterVar_automated", "InterVar_filter")]},
+		"InputColumns": ["Chr", "Start", "End", "Ref", "Alt", "ENCODE_Blacklist.name", "UCSC_UnusualRegions.name", "REVEL", "MutPred_rankscore"] + list(Config["OtherInfo"].keys()) + Config["GIAB"] + Config["NCBI_Problems"] + list(Config["WipeIntergene"].keys()) + list(Config["WipeIntergene"].values()) + Config["GeneNames"] + Config["Func"] + Config["ExonicFunc"] + Config["Details"] + SymbolCols + Config["dbscSNV"] + Config["ConservationRS"] + Config["MedicalPopulationData"] + Config["PopulationData"] + Config["ShortVariant"]
+	}
+	Context["GIABNames"] = pandas.Index([f"{item[5:]};" for item in Context["GIABCols"]])
+	
+	# Read-only tables
+	Context["HGMDTable"] = LoadHGMD(HGMD)
+	Context["XRefTable"] = LoadXRef(AnnovarFolder)
+	return Context
+
+def AnnoFitWorker(Context: dict) -> None: AnnoFitChunk.Context = Context
+
+def AnnoFitChunk(
+		ChunkNum: int,
+		Data: pandas.DataFrame,
+		Filtering: str) -> tuple:
+	
+	# Context is set once per worker process by AnnoFitWorker
+	Context = AnnoFitChunk.Context
+	Config = Context["Config"]
+	Log = []
+	
+	# ANNOVAR Table
+	ChunkTime = time.time()
+	StartTime = time.time()
+	
+	Data.fillna('.', inplace=True)
+	
+	# Problematic Regions
+	Data["GIAB_Problems"] = FormatGIAB(Data, Context)
+	Data["NCBI_Problems"] = FormatNCBIProblems(Data, Context)
+	Data = Data.rename(columns={"ENCODE_Blacklist.name": "ENCODE_Blacklist", 'UCSC_UnusualRegions.name': 'UCSC_UnusualRegions'})
+	
+	# Basic info format
+	Data.rename(columns=Config["OtherInfo"], inplace=True) # Rename OtherInfo
+	for Col in ["Start", "End"]: Data[Col] = FormatCoordinates(Data[Col]) # Prepare coords
+	for Col in Config["WipeIntergene"]: Data[Config["WipeIntergene"][Col]] = Data[Config["WipeIntergene"][Col]].mask(Data[Col].astype(str).str.contains(Context["WipePattern"], na=False), ".")
+	Data["AnnoFit.GeneName"] = FormatGenesOrFunction(Data[Config["GeneNames"]]) # Gene Names
+	Data["AnnoFit.Func"] = FormatGenesOrFunction(Data[Config["Func"]]) # Gene Func
+	Data["AnnoFit.ExonicFunc"] = FormatGenesOrFunction(Data[Config["ExonicFunc"]]) # Gene Exonic Func
+	Data["AnnoFit.Details"] = FormatDetails(Data[Config["Details"]]) # Details
+	for Col in Context["CategoryCols"]: Data[Col] = Data[Col].astype('category') # Low-cardinality filter columns
+	
+	# VCF Data
+	VCF_Metadata = FormatVcfMetadata(Data)
+	Data.drop(columns=["VCF.FORMAT", "VCF.SAMPLE"], inplace=True)
+	Data = pandas.concat([Data, VCF_Metadata.fillna('.')], axis=1, sort=False)
+	del VCF_Metadata
+	Data["VCF.GT"] = FormatGenotype(Data["VCF.GT"]) # Prepare Genotype
+	
+	# Predictions: symbols, REVEL, MutPred, dbscSNV, conservation
+	for Col, Values in FormatPredictions(Data, Context).items(): Data[Col] = Values
+	
+	# Population
+	for Col in Config["MedicalPopulationData"]: Data[Col] = FormatPopulationFreq(Data[Col])
+	Data["AnnoFit.PopFreqMax"] = FormatPopulationFreq(Data[Config["PopulationData"]]).max(axis=1)
+	
+	# Shorten table
+	Data = Data[Config["ShortVariant"]]
+	Log.append(f"ANNOVAR table is prepared - %s" % (SecToTime(time.time() - StartTime)))
+	
+	# Merge with HGMD
+	StartTime = time.time()
+	Data = Data.join(Context["HGMDTable"], on=["Chr", "Start", "End"], how='left').reset_index(drop=True)
+	Data[Context["HGMDTable"].columns] = Data[Context["HGMDTable"].columns].fillna('.')
+	Log.append(f"HGMD merged - %s" % (SecToTime(time.time() - StartTime)))
+	
+	# Merge with XRef
+	StartTime = time.time()
+	XRef = SqueezeXRef(Data["AnnoFit.GeneName"], Context["XRefTable"])
+	Data = pandas.concat([Data, XRef.fillna('.')], axis=1, sort=False).copy() # Consolidate fragmented blocks before filtering
+	del XRef
+	Log.append(f"XRef merged - %s" % (SecToTime(time.time() - StartTime)))
+	
+	if Filtering == "full":
+		# Base Filtering
+		StartTime = time.time()
+		Filters = {}
+		Filters["DP"] = FilterDepth(Data["VCF.AD"])
+		Filters["OMIM"] = Data["Disease_description"] != '.'
+		Filters["HGMD"] = Data['HGMD'] != '.'
+		Filters["PopMax"] = Data["AnnoFit.PopFreqMax"] < Config["PopMax_filter"]
+		Filters["ExonPred"] = FilterExonPrediction(Data["AnnoFit.ExonPred"], Config["ExonPredThreshold"])
+		Filters["SplicePred"] = Data["AnnoFit.SplicePred"].isin(Context["FilterSets"]["AnnoFit.SplicePred"])
+		Filters["IntronPred"] = Data["regsnp_disease"].isin(Context["FilterSets"]["regsnp_disease"])
+		Filters["Significance"] = Data["InterVar_automated"].isin(Context["FilterSets"]["InterVar_automated"])
+		for Name, (Col, Pattern) in Context["TokenFilters"].items(): Filters[Name] = ContainsPattern(Data[Col], Pattern)
+		Filters["Problematic"] = pandas.Series(numpy.logical_and.reduce([~Data[Col].isin(Items).to_numpy() for Col, Items in Context["ProblemSets"].items()] + [numpy.ones(Data.shape[0], dtype=bool)]), index=Data.index)
+		
+		Data = Data[Filters["DP"] & Filters["PopMax"] & Filters["Problematic"] & ( Filters["HGMD"] | Filters["ExonPred"] | Filters["SplicePred"] | Filters["IntronPred"] | Filters["Significance"] | Filters["CLINVAR"] | Filters["ExonicFunc"] | Filters["Splicing"] | (Filters["ncRNA"] & Filters["OMIM"]))]
+		Log.append(f"Base filtering is ready - %s" % (SecToTime(time.time() - StartTime)))
+	
+	Log.append(f"Chunk #{str(ChunkNum + 1)} - %s" % (SecToTime(time.time() - ChunkTime)))
+	return ChunkNum, Data, Log
+
 def AnnoFit(
 		InputTSV: str,
 		OutputXLSX: str,
@@ -346,225 +772,85 @@ def AnnoFit(
 		AnnoFitConfig: str,
 		ChunkSize: int,
 		Filtering: str = "full",
-		Threads: int = cpu_count()) -> None:
+		Threads: int = cpu_count(),
+		Output: Union[concurrent.futures.Executor, None] = None) -> Union[concurrent.futures.Future, None]:
 	
 	MODULE_NAME = "AnnoFit"
 	
 	# Logging
 	for line in [f"Input TSV: {InputTSV}", f"Output XLSX: {OutputXLSX}", f"Chunk Size: {str(ChunkSize)}"]: logging.info(line)
 	
-	# Initialize Pandarallel
-	pandarallel.initialize(nb_workers=Threads, verbose=1)
-	
-	# Global func
-	def FormatInt(String: str) -> Union[int, None]:
-		try:
-			return int(String)
-		except ValueError:
-			return None
-	def FormatFloat(String: str) -> Union[float, None]:
-		try:
-			return float(String)
-		except ValueError:
-			return None
-	def SqueezeTable(DataFrame: pandas.DataFrame) -> pandas.Series:
-		if DataFrame.shape[0] == 1: return DataFrame.iloc[0]
-		if DataFrame.shape[0] == 0: return pandas.Series(index=DataFrame.columns.to_list(), dtype=object).fillna('.')
-		Squeezed = pandas.Series(dtype=object)
-		for col in DataFrame.columns.to_list():
-			Squeezed[col] = ';'.join(sorted([str(x) for x in DataFrame[col].to_list() if x != '.']))
-			if Squeezed[col] == '': Squeezed[col] = '.'
-		return Squeezed
-	
 	# Format func
-	def FormatCoordinates(String: str) -> Union[int, str]:
-		Result = FormatInt(String)
-		return ('.' if Result is None else Result)
-	def FormatPopulationFreq(String: str) -> float:
-		Result = FormatFloat(String)
-		return (-1.0 if Result is None else Result)
-	def FormatVcfMetadata(Block: pandas.Series) -> dict:
-		Block = {"Header": Block["VCF.FORMAT"], "Data": Block["VCF.SAMPLE"], "Name": Block.name}
-		Block["Header"] = [f"VCF.{item}" for item in str(Block["Header"]).split(":")]
-		Block["Data"] = str(Block["Data"]).split(":")
-		Result = {"Name": Block["Name"]}
-		if len(Block["Header"]) != len(Block["Data"]): return Result
-		for Num in range(len(Block["Header"])): Result[Block["Header"][Num]] = Block["Data"][Num]
-		return Result
-	def FormatGenesOrFunction(Series: pandas.Series) -> str:
-		Genes = [item for item in Series.to_list() if ((type(item) is str) and (item != "."))]
-		Genes = [item.split(';') for item in Genes]
-		Genes = list(set([item for sublist in Genes for item in sublist]))
-		return (';'.join(sorted(Genes)) if Genes else '.')
-	def FormatRevel(Value: str) -> str:
-		Value = FormatFloat(Value)
-		return ("U" if Value is None else ("D" if (Value <= 0.5) else "T"))
-	def FormatDbscSNV(Series: pandas.Series) -> str:
-		Result = [FormatFloat(item) for item in Series.to_list()]
-		return ("." if any([item is None for item in Result]) else ("D" if any([item > 0.6 for item in Result]) else "T"))
-	def FormatMutPred(Str: str) -> str:
-		Result = FormatFloat(Str)
-		return ("U" if Result is None else ("D" if (Result >= 0.9) else "T"))
 	def FormatOmimCodes(Series: pandas.Series) -> dict:
 		Groups = re.findall("\\[MIM:([\\d]+)\\]", str(Series["Disease_description"]))
 		Result = {"Name": Series.name}
-		for num, item in enumerate(Groups): Result[f"OMIM-{num:02d}"] = f"=HYPERLINK(\"https://omim.org/entry/{item}\", \"{item}\")"
+		for num, item in enumerate(Groups): Result[f"OMIM-{num:02d}"] = item
 		return Result
-	def FormatGenotype(Str: str) -> str:
-		Lst = [FormatInt(item) for item in Str.split('/')]
-		if (len(Lst) != 2) or any([item is None for item in Lst]): return '.'
-		return ('HOMO' if ((Lst[0] == Lst[1]) and (Lst[0] != 0)) else Str)
-	def FormatConservation(Series: pandas.Series) -> str:
-		Series = Series.to_list()
-		for i in range(len(Series)):
-			Rank = FormatFloat(Series[i])
-			Series[i] = "U" if Rank is None else ("D" if Rank >= 0.7 else "T")
-		return "/".join([str(Series.count("D")), str(Series.count("D") + Series.count("T"))]) if Series.count("U") < len(Series) else '.'
-	def FormatDetails(Series: pandas.Series) -> str:
-		lst = [item for item in Series.to_list() if ((type(item) is str) and (item != "."))]
-		return '.' if not lst else ';'.join(lst)
-	def FormatExonPrediction(Series: pandas.Series) -> str:
-		Result = ''.join(Series.to_list())
-		return ('.' if (Result.count('D') + Result.count('T') == 0) else '/'.join([str(Result.count('D')), str(Result.count('D') + Result.count('T'))]))
-	def	FormatGIAB(Series: pandas.Series) -> str:
-		Result = sorted(list(set([str(key[5:]) for key, value in Series.to_dict().items() if value != '.'])))
-		return '.' if not Result else ';'.join(Result)
-	def	FormatNCBIProblems(Series: pandas.Series) -> str:
-		Result = sorted(list(set([str(key[5:-6]) for key, value in Series.to_dict().items() if key[-6:] == '.start' and value != '.'])), key=lambda x: Config["NCBI_Problems_Ranks"][x])
-		return '.' if not Result else Result[-1]
-	FormatdbSNP = lambda x: '.' if x == '.' else f"=HYPERLINK(\"https://www.ncbi.nlm.nih.gov/snp/{x}\", \"{x}\")"
-	FormatUCSC = lambda x: f"=HYPERLINK(\"https://genome.ucsc.edu/cgi-bin/hgTracks?db=hg19&position={x['Chr']}%3A{str(x['Start'])}%2D{str(x['End'])}\", \"{x['Chr']}:{str(x['Start'])}\")"
-	FormatGenomeBrowser = lambda x: '.' if x == '.' else f"=HYPERLINK(\"https://www.genecards.org/Search/Keyword?queryString={'%20OR%20'.join(['%5Baliases%5D(%20' + str(item) + '%20)' for item in x.split(';')])}&keywords={','.join([str(item) for item in x.split(';')])}\", \"{x}\")"
+	def FormatOmimLinks(Series: pandas.Series) -> pandas.Series: return ("https://omim.org/entry/" + Series.astype(str)).where(Series != '.')
+	def FormatdbSNP(Series: pandas.Series) -> pandas.Series: return ("https://www.ncbi.nlm.nih.gov/snp/" + Series.astype(str)).where(Series != '.')
+	def FormatUCSC(Data: pandas.DataFrame) -> pandas.Series:
+		Chrom, Start, End = Data["Chr"].astype(str), Data["Start"].astype(str), Data["End"].astype(str)
+		return "https://genome.ucsc.edu/cgi-bin/hgTracks?db=hg19&position=" + Chrom + "%3A" + Start + "%2D" + End
+	FormatGenomeBrowser = lambda x: None if x == '.' else f"https://www.genecards.org/Search/Keyword?queryString={'%20OR%20'.join(['%5Baliases%5D(%20' + str(item) + '%20)' for item in x.split(';')])}&keywords={','.join([str(item) for item in x.split(';')])}"
 	
 	# Filter func
-	def FilterpLi(Str: str) -> bool:
-		Result = [FormatFloat(item) for item in Str.split(';')]
-		return (False if any([item is None for item in Result]) else any([item >= 0.9 for item in Result]))
-	def FilterDepth(Str: str) -> bool:
-		Result = [FormatInt(item) for item in Str.split(',')]
-		return (False if any([item is None for item in Result]) else any([item >= 4 for item in Result]))
-	def FilterExonPrediction(Str: str) -> bool:
-		Result = FormatInt(Str.split('/')[0])
-		return (False if Result is None else (Result >= 3))
-	FilterOmimDominance = lambda x: len(re.findall('[\W]dominant[\W]', str(x).lower())) != 0
-	FilterNoInfo = lambda x: (x["pLi"] == '.') and (x["Disease_description"] == '.') or (len(re.findall('([\W]dominant[\W])|([\W]recessive[\W])', str(["Disease_description"]).lower())) == 0)
+	DominantPattern = re.compile(r'\Wdominant\W', re.IGNORECASE)
 	
 	# Load Data
 	GlobalTime = time.time()
 	StartTime = time.time()
-	Result = None
 	Config = AnnoFitConfig
-	HGMDTable = pandas.read_csv(HGMD, sep='\t', dtype=str)
-	for Col in ['Chromosome/scaffold position start (bp)', 'Chromosome/scaffold position end (bp)']: HGMDTable[Col] = HGMDTable[Col].parallel_apply(FormatCoordinates)
-	XRefTable = pandas.read_csv(os.path.join(AnnovarFolder, "example/gene_fullxref.txt"), sep='\t', dtype=str).set_index("#Gene_name").rename_axis(None, axis=1)
+	Context = AnnoFitContext(Config, HGMD, AnnovarFolder)
+	XRefTable = Context["XRefTable"]
 	logging.info(f"Data loaded - %s" % (SecToTime(time.time() - StartTime)))
 	
-	for ChunkNum, Data in enumerate(pandas.read_csv(InputTSV, sep='\t', dtype=str, chunksize=ChunkSize)):
-		
-		# ANNOVAR Table
-		ChunkTime = time.time()
-		StartTime = time.time()
-		
-		Data.fillna('.', inplace=True)
+	# Chunks are independent: each worker receives the read-only context once, at start.
+	# Workers come from a forkserver, since the output thread may still be writing the previous unit
+	PoolTime = time.time()
+	with concurrent.futures.ProcessPoolExecutor(max_workers=Threads, mp_context=multiprocessing.get_context("forkserver"), initializer=AnnoFitWorker, initargs=(Context,)) as Workers:
+		Parts, Pending = {}, set()
+		def CollectChunks(Futures) -> None:
+			for Future in Futures:
+				ChunkNum, Data, Log = Future.result()
+				for line in Log: logging.info(line)
+				Parts[ChunkNum] = Data
+		# Bounded window: the reader stays at most 2 * Threads chunks ahead of the workers
+		for ChunkNum, Data in enumerate(ReadTableChunks(InputTSV, Context["InputColumns"], ChunkSize)):
+			if len(Pending) >= 2 * Threads:
+				Done, Pending = concurrent.futures.wait(Pending, return_when=concurrent.futures.FIRST_COMPLETED)
+				CollectChunks(Done)
+			Pending.add(Workers.submit(AnnoFitChunk, ChunkNum, Data, Filtering))
+		CollectChunks(concurrent.futures.as_completed(Pending))
 		
-		# Problematic Regions
-		Data["GIAB_Problems"] = Data[Config["GIAB"]].parallel_apply(FormatGIAB, axis=1)
-		Data["NCBI_Problems"] = Data[Config["NCBI_Problems"]].parallel_apply(FormatNCBIProblems, axis=1)
-		Data = Data.rename(columns={"ENCODE_Blacklist.name": "ENCODE_Blacklist", 'UCSC_UnusualRegions.name': 'UCSC_UnusualRegions'})
+		Result = pandas.concat([Parts[ChunkNum] for ChunkNum in sorted(Parts)], axis=0, ignore_index=True)
+		del Parts, Pending
 		
-		# Basic info format
-		Data.rename(columns=Config["OtherInfo"], inplace=True) # Rename OtherInfo
-		Data[["Start", "End"]] = Data[["Start", "End"]].parallel_applymap(FormatCoordinates) # Prepare coords
-		for Col in Config["WipeIntergene"]: Data[Config["WipeIntergene"][Col]] = Data[[Col, Config["WipeIntergene"][Col]]].parallel_apply(lambda x: "." if any([item in Config["IntergeneSynonims"] for item in str(x[Col]).split(';')]) else x[Config["WipeIntergene"][Col]], axis=1)
-		Data["AnnoFit.GeneName"] = Data[Config["GeneNames"]].parallel_apply(FormatGenesOrFunction, axis=1) # Gene Names
-		Data["AnnoFit.Func"] = Data[Config["Func"]].parallel_apply(FormatGenesOrFunction, axis=1) # Gene Func
-		Data["AnnoFit.ExonicFunc"] = Data[Config["ExonicFunc"]].parallel_apply(FormatGenesOrFunction, axis=1) # Gene Exonic Func
-		Data["AnnoFit.Details"] = Data[Config["Details"]].parallel_apply(FormatDetails, axis=1) # Details
-		
-		# VCF Data
-		VCF_Metadata = pandas.DataFrame(Data[["VCF.FORMAT", "VCF.SAMPLE"]].parallel_apply(FormatVcfMetadata, axis=1).to_list()).set_index("Name").rename_axis(None, axis=1)
-		Data.drop(columns=["VCF.FORMAT", "VCF.SAMPLE"], inplace=True)
-		Data = pandas.concat([Data, VCF_Metadata], axis=1, sort=False)
-		Data.fillna('.', inplace=True)
-		del VCF_Metadata
-		Data["VCF.GT"] = Data["VCF.GT"].parallel_apply(FormatGenotype) # Prepare Genotype
-		
-		# Symbol Predictions
-		for Column in Config["SymbolPred"]: Data[Column["Name"]] = Data[Column["Name"]].parallel_apply(lambda x: "U" if x not in Column["Symbols"] else Column["Symbols"][x])
-		Data["REVEL"] = Data["REVEL"].parallel_apply(FormatRevel)
-		Data["MutPred_rankscore"] = Data["MutPred_rankscore"].parallel_apply(FormatMutPred)
-		ColNames = [item["Name"] for item in Config["SymbolPred"]] + ["REVEL", "MutPred_rankscore"]
-		Data["AnnoFit.ExonPred"] = Data[ColNames].parallel_apply(FormatExonPrediction, axis=1)
-		Data["AnnoFit.SplicePred"] = Data[Config["dbscSNV"]].parallel_apply(FormatDbscSNV, axis=1) # dbscSNV
-		Data["AnnoFit.Conservation"] = Data[Config["ConservationRS"]].parallel_apply(FormatConservation, axis=1) # Conservation
-		
-		# Population
-		for Col in Config["MedicalPopulationData"]: Data[Col] = Data[Col].parallel_apply(FormatPopulationFreq)
-		Data["AnnoFit.PopFreqMax"] = Data[Config["PopulationData"]].parallel_apply(lambda x: x.apply(FormatPopulationFreq).max(), axis=1)
-		
-		# Shorten table
-		Data = Data[Config["ShortVariant"]]
-		logging.info(f"ANNOVAR table is prepared - %s" % (SecToTime(time.time() - StartTime)))
-		
-		# Merge with HGMD
-		StartTime = time.time()
-		Data = pandas.merge(Data, HGMDTable, how='left', left_on=["Chr", "Start", "End"], right_on=["Chromosome/scaffold name", "Chromosome/scaffold position start (bp)", "Chromosome/scaffold position end (bp)"])
-		Data.rename(columns={"Variant name": "HGMD"}, inplace=True)
-		Data.fillna('.', inplace=True)
-		logging.info(f"HGMD merged - %s" % (SecToTime(time.time() - StartTime)))
-		
-		# Merge with XRef
-		StartTime = time.time()
-		XRef = Data["AnnoFit.GeneName"].parallel_apply(lambda x: SqueezeTable(XRefTable.loc[[item for item in x.split(';') if item in XRefTable.index],:]))
-		Data = pandas.concat([Data, XRef], axis=1, sort=False)
-		Data.fillna('.', inplace=True)
-		del XRef
-		logging.info(f"XRef merged - %s" % (SecToTime(time.time() - StartTime)))
+		# Compound
+		if Filtering == "full":
+			Genes = Result['AnnoFit.GeneName'].str.split(';').explode()
+			GeneCounts = Genes.map(Genes.value_counts())
+			Result['Annofit.Compound'] = GeneCounts.astype(str).groupby(level=0, sort=False).agg(';'.join)
+		else: Result['Annofit.Compound'] = "."
 		
 		if Filtering == "full":
-			# Base Filtering
+			# Dominance Filtering
 			StartTime = time.time()
 			Filters = {}
-			Filters["DP"] = Data["VCF.AD"].parallel_apply(FilterDepth)
-			Filters["OMIM"] = Data["Disease_description"].parallel_apply(lambda x: x != '.')
-			Filters["HGMD"] = Data['HGMD'].parallel_apply(lambda x: x != '.')
-			Filters["PopMax"] = Data["AnnoFit.PopFreqMax"] < Config["PopMax_filter"]
-			Filters["ExonPred"] = Data["AnnoFit.ExonPred"].parallel_apply(FilterExonPrediction)
-			Filters["SplicePred"] = Data["AnnoFit.SplicePred"].parallel_apply(lambda x: x in Config["SplicePred_filter"])
-			Filters["IntronPred"] = Data["regsnp_disease"].parallel_apply(lambda x: x in Config["IntronPred_filter"])
-			Filters["Significance"] = Data["InterVar_automated"].parallel_apply(lambda x: x in Config["InterVar_filter"])
-			Filters["CLINVAR"] = Data["CLNSIG"].parallel_apply(lambda x: any([item in Config["CLINVAR_filter"] for item in str(x).split(',')]))
-			Filters["ExonicFunc"] = Data["AnnoFit.ExonicFunc"].parallel_apply(lambda x: any([item in Config["ExonicFunc_filter"] for item in str(x).split(';')]))
-			Filters["ncRNA"] = Data["AnnoFit.Func"].parallel_apply(lambda x: any([item in Config["ncRNA_filter"] for item in str(x).split(';')]))
-			Filters["Splicing"] = Data["AnnoFit.Func"].parallel_apply(lambda x: any([item in Config["Splicing_filter"] for item in str(x).split(';')]))
-			Filters["Problematic"] = Data[list(Config["Problems"].keys())].parallel_apply(lambda x: all([(x[index] not in item) for index, item in Config["Problems"].items()]), axis=1)
-			
-			Data = Data[Filters["DP"] & Filters["PopMax"] & Filters["Problematic"] & ( Filters["HGMD"] | Filters["ExonPred"] | Filters["SplicePred"] | Filters["IntronPred"] | Filters["Significance"] | Filters["CLINVAR"] | Filters["ExonicFunc"] | Filters["Splicing"] | (Filters["ncRNA"] & Filters["OMIM"]))]
-		logging.info(f"Base filtering is ready - %s" % (SecToTime(time.time() - StartTime)))
-		
-		#Concat chunks
-		Result = Data if Result is None else pandas.concat([Result, Data], axis=0, ignore_index=True)
-		logging.info(f"Chunk #{str(ChunkNum + 1)} - %s" % (SecToTime(time.time() - ChunkTime)))
-	
-	# Compound
-	if Filtering == "full":
-		Result['Annofit.Compound'] = Result['AnnoFit.GeneName'].parallel_apply(lambda x: ';'.join([str(Result['AnnoFit.GeneName'].apply(lambda y: gene in y.split(';')).value_counts()[True]) for gene in x.split(';')]))
-	else: Result['Annofit.Compound'] = "."
+			Filters["pLi"] = FilterpLi(Result["pLi"])
+			Filters["OMIM_Dominance"] = Result["Disease_description"].astype(str).str.contains(DominantPattern, na=False)
+			Filters["Zygocity"] = Result["VCF.GT"] == 'HOMO'
+			# Kept as it has always behaved: the inheritance regex is matched against the constant
+			# string "['disease_description']", not the row, so every variant passes this filter
+			Filters["NoInfo"] = pandas.Series(True, index=Result.index)
+			Filters["Compound_filter"] = (GeneCounts > 1).groupby(level=0).any()
+			Result = Result[ Filters["Compound_filter"] | Filters["pLi"] | Filters["OMIM_Dominance"] | Filters["Zygocity"] | Filters["NoInfo"] ]
+			logging.info(f"Filtering is ready - %s" % (SecToTime(time.time() - StartTime)))
+	logging.info(f"{MODULE_NAME} finished on {str(Threads)} threads, summary time - %s" % (SecToTime(time.time() - PoolTime)))
 	
-	if Filtering == "full":
-		# Dominance Filtering
-		StartTime = time.time()
-		Filters = {}
-		Filters["pLi"] = Result["pLi"].parallel_apply(FilterpLi)
-		Filters["OMIM_Dominance"] = Result["Disease_description"].parallel_apply(FilterOmimDominance)
-		Filters["Zygocity"] = Result["VCF.GT"].parallel_apply(lambda x: x == 'HOMO')
-		Filters["NoInfo"] = Result[["pLi", "Disease_description"]].parallel_apply(FilterNoInfo, axis=1)
-		Filters["Compound_filter"] = Result['Annofit.Compound'].parallel_apply(lambda x: any([int(item) > 1 for item in x.split(';')]))
-		Result = Result[ Filters["Compound_filter"] | Filters["pLi"] | Filters["OMIM_Dominance"] | Filters["Zygocity"] | Filters["NoInfo"] ]
-		logging.info(f"Filtering is ready - %s" % (SecToTime(time.time() - StartTime)))
-		
 	Result = Result.sort_values(by=["Chr", "Start", "End"])
+	for Col in ["Start", "End"]: Result[Col] = Result[Col].astype(object).where(Result[Col].notna(), '.') # Unparsed coords are shown as '.'
 	Result["UCSC"] = "."
+	ResultLinks, GenesLinks = {}, {}
 	
 	if Filtering == "full":
 		# Make genes list
@@ -573,16 +859,18 @@ def AnnoFit(
 		Genes = list(set([item for sublist in Genes for item in sublist]))
 		GenesTable = XRefTable.loc[[item for item in Genes if item in XRefTable.index],:].reset_index().rename(columns={"index": "#Gene_name"}).sort_values(by=["#Gene_name"])[Config["ShortGenesTable"]]
 		# TODO NoInfo Genes?
-		del XRefTable
+		del XRefTable, Context
 		logging.info(f"Genes list is ready - %s" % (SecToTime(time.time() - StartTime)))
 		
 		# Hyperlinks
 		StartTime = time.time()
-		Result["avsnp150"] = Result["avsnp150"].parallel_apply(FormatdbSNP)
-		Result["UCSC"] = Result[["Chr", "Start", "End"]].parallel_apply(FormatUCSC, axis=1)
-		Result["AnnoFit.GeneName"] = Result["AnnoFit.GeneName"].apply(FormatGenomeBrowser)
-		OMIM_links = pandas.DataFrame(GenesTable[["pLi", "Disease_description"]].parallel_apply(FormatOmimCodes, axis=1).to_list()).set_index("Name").fillna('.').rename_axis(None, axis=1)
+		ResultLinks["avsnp150"] = FormatdbSNP(Result["avsnp150"])
+		ResultLinks["UCSC"] = FormatUCSC(Result)
+		Result["UCSC"] = Result["Chr"].astype(str) + ":" + Result["Start"].astype(str)
+		ResultLinks["AnnoFit.GeneName"] = Result["AnnoFit.GeneName"].map(FormatGenomeBrowser)
+		OMIM_links = pandas.DataFrame(GenesTable[["pLi", "Disease_description"]].apply(FormatOmimCodes, axis=1).to_list()).set_index("Name").fillna('.').rename_axis(None, axis=1)
 		GenesTable = pandas.concat([GenesTable, OMIM_links], axis=1, sort=False)
+		for Col in OMIM_links.columns: GenesLinks[Col] = FormatOmimLinks(GenesTable[Col])
 		logging.info(f"Hyperlinks are ready - %s" % (SecToTime(time.time() - StartTime)))
 	
     #find entertainment variants rs
@@ -594,83 +882,108 @@ def AnnoFit(
 	StartTime = time.time()
 	Result = Result[Config["FinalVariant"]]
 	Result.insert(0, 'Comment', '')
-	if Filtering == "full":
-		with pandas.ExcelWriter(OutputXLSX) as Writer:
-			Result.to_excel(Writer, "Variants", index=False)
-			GenesTable.to_excel(Writer, "Genes", index=False)
-			Writer.save()
-	else:
-		with pandas.ExcelWriter(OutputXLSX) as Writer:
-			Result.to_excel(Writer, "Variants", index=False)
-			rs_found.to_excel(Writer, "Ent variants found", index=False)
-			Writer.save()
+	Sheets = {"Variants": (Result, ResultLinks), "Genes": (GenesTable, GenesLinks)} if Filtering == "full" else {"Variants": (Result, ResultLinks), "Ent variants found": (rs_found, {})}
+	if Output is not None:
+		logging.info(f"{MODULE_NAME} finish, saving in background - %s" % (SecToTime(time.time() - GlobalTime)))
+		return Output.submit(SaveXLSX, OutputXLSX, Sheets)
+	SaveXLSX(OutputXLSX, Sheets)
 	
 	logging.info(f"Files saved - %s" % (SecToTime(time.time() - StartTime)))
 	logging.info(f"{MODULE_NAME} finish - %s" % (SecToTime(time.time() - GlobalTime)))
 
 # ------======| ANNOTATION PIPELINE |======------
 
+def FinishStage(
+		Saving: concurrent.futures.Future,
+		Unit: dict,
+		StageAlias: str,
+		UnitsFile: str) -> None:
+	
+	# Runs on the output executor after the stage files are written
+	Saving.result()
+	LogStage(Unit, StageAlias, UnitsFile)
+	SaveUnit(Unit, UnitsFile)
+
 def AnnoPipe(
 		AnnovarFolder: str,
 		UnitsFile: str,
-		Filtering: str, Genome) -> None:
-	DaemonicConf = json.load(open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'DaemonicPipeline_config.json'), 'rt'))
-	AnnofitConf = json.load(open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'AnnoFit_config.json'), 'rt'))
-	
-	Unit = json.load(open(UnitsFile, 'rt'))
-	Unit['AnnovarFolder'] = os.path.realpath(AnnovarFolder)
-	Unit['AnnovarXRef'] = os.path.join(Unit['AnnovarFolder'], DaemonicConf['AnnovarXRefPath'])
-	Unit['AnnovarDatabasesPath'] = os.path.join(Unit['AnnovarFolder'], DaemonicConf['AnnovarDBFolder'])
-	Unit['AnnovarDatabases'] = DaemonicConf['AnnovarDatabases']
-	Unit['Reference']['GenomeInfo']['annovar_alias'] = Genome
-	Unit['GFF3'] = DaemonicConf['GFF3']
-	Unit['HGMDPath'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), DaemonicConf['HGMDPath'])
-	Unit['AnnoFit'] = AnnofitConf
-	Unit['Output']['AnnovarTable'] = f'_temp.{Unit["ID"]}.annovar.tsv'
-	Unit['Output']['VariantsTable'] = {'full': f'{Unit["ID"]}.variants.xlsx', 'no': f'{Unit["ID"]}.variants.unfiltered.xlsx'}[Filtering]
-	json.dump(Unit, open(UnitsFile, 'wt'), indent = 4, ensure_ascii = False)
-	
-	StageAlias = 'Annovar'
-	if StageAlias not in Unit['Stage']:
-		ANNOVAR(
-			InputVCF = os.path.join(Unit['OutputDir'], Unit["Output"]["VCF"]),
-			OutputTSV = os.path.join(Unit['OutputDir'], Unit['Output']['AnnovarTable']),
-			Databases = Unit["AnnovarDatabases"],
-			DBFolder = Unit["AnnovarDatabasesPath"],
-			AnnovarFolder = Unit["AnnovarFolder"],
-			GenomeAssembly = Unit['Reference']['GenomeInfo']['annovar_alias'],
-			Threads = Unit["Config"]["Threads"])
-		Unit['Stage'].append(StageAlias)
-		json.dump(Unit, open(UnitsFile, 'wt'), indent = 4, ensure_ascii = False)
-	
-	if Unit["GFF3"]:
-		StageAlias = 'GFF3'
-		if StageAlias not in Unit['Stage']:
-			CureBase(
-				DBDir = os.path.dirname(os.path.abspath(__file__)),
-				InputVCF = os.path.join(Unit['OutputDir'], Unit["Output"]["VCF"]),
-				OutputTSV = os.path.join(Unit['OutputDir'], Unit['Output']['AnnovarTable']),
+		Filtering: str, Genome,
+		Output: Union[concurrent.futures.Executor, None] = None,
+		CheckpointEvery: int = 1) -> Union[concurrent.futures.Future, None]:
+	
+	# With an Output executor, the final XLSX write overlaps with the next unit
+	DaemonicConf = LoadConfig('DaemonicPipeline_config.json')
+	AnnofitConf = dc(LoadConfig('AnnoFit_config.json'))
+	PackageDir = os.path.dirname(os.path.abspath(__file__))
+	
+	with UnitsFileWriter(UnitsFile) as Unit:
+		Unit['AnnovarFolder'] = os.path.realpath(AnnovarFolder)
+		Unit['AnnovarXRef'] = os.path.join(Unit['AnnovarFolder'], DaemonicConf['AnnovarXRefPath'])
+		Unit['AnnovarDatabasesPath'] = os.path.join(Unit['AnnovarFolder'], DaemonicConf['AnnovarDBFolder'])
+		Unit['AnnovarDatabases'] = DaemonicConf['AnnovarDatabases']
+		Unit['Reference']['GenomeInfo']['annovar_alias'] = Genome
+		Unit['GFF3'] = DaemonicConf['GFF3']
+		Unit['HGMDPath'] = os.path.join(PackageDir, DaemonicConf['HGMDPath'])
+		Unit['AnnoFit'] = AnnofitConf
+		Unit['Output']['AnnovarTable'] = f'_temp.{Unit["ID"]}.annovar.tsv'
+		Unit['Output']['VariantsTable'] = {'full': f'{Unit["ID"]}.variants.xlsx', 'no': f'{Unit["ID"]}.variants.unfiltered.xlsx'}[Filtering]
+		
+		# Stage invariants
+		Done = set(Unit['Stage'])
+		Threads = Unit["Config"]["Threads"]
+		InputVCF = os.path.join(Unit['OutputDir'], Unit["Output"]["VCF"])
+		AnnovarTable = os.path.join(Unit['OutputDir'], Unit['Output']['AnnovarTable'])
+		VariantsTable = os.path.join(Unit['OutputDir'], Unit['Output']['VariantsTable'])
+		Reference = os.path.join(Unit['Reference']['GenomeDir'], Unit['Reference']['GenomeInfo']['fasta'])
+		
+		# (Alias, Enabled, Stage). A stage may return a future for output still being written;
+		# only the last stage does, so nothing downstream reads that output early
+		Stages = [
+			('Annovar', True, functools.partial(ANNOVAR,
+				InputVCF = InputVCF,
+				OutputTSV = AnnovarTable,
+				Databases = Unit["AnnovarDatabases"],
+				DBFolder = Unit["AnnovarDatabasesPath"],
+				AnnovarFolder = Unit["AnnovarFolder"],
+				GenomeAssembly = Genome,
+				Sidecar = not Unit["GFF3"], # CureBase rewrites the table and its sidecar otherwise
+				Threads = Threads)),
+			('GFF3', bool(Unit["GFF3"]), functools.partial(CureBase,
+				DBDir = PackageDir,
+				InputVCF = InputVCF,
+				OutputTSV = AnnovarTable,
 				Databases = Unit["GFF3"],
 				AnnovarFolder = Unit["AnnovarFolder"],
-				Reference = os.path.join(Unit['Reference']['GenomeDir'], Unit['Reference']['GenomeInfo']['fasta']),
-				GenomeAssembly = Unit['Reference']['GenomeInfo']['annovar_alias'],
-				Threads = Unit["Config"]["Threads"])
-			Unit['Stage'].append(StageAlias)
-			json.dump(Unit, open(UnitsFile, 'wt'), indent = 4, ensure_ascii = False)
-	
-	StageAlias = 'Annofit'
-	if StageAlias not in Unit['Stage']:
-		AnnoFit(
-			InputTSV = os.path.join(Unit['OutputDir'], Unit['Output']['AnnovarTable']),
-			OutputXLSX = os.path.join(Unit['OutputDir'], Unit['Output']['VariantsTable']),
-			HGMD = Unit["HGMDPath"],
-			AnnovarFolder = Unit["AnnovarFolder"],
-			AnnoFitConfig = Unit["AnnoFit"],
-			ChunkSize = Unit["AnnoFit"]["AnnofitChunkSize"],
-			Threads = Unit["Config"]["Threads"],
-			Filtering = Filtering)
-		Unit['Stage'].append(StageAlias)
-		json.dump(Unit, open(UnitsFile, 'wt'), indent = 4, ensure_ascii = False)
+				Reference = Reference,
+				GenomeAssembly = Genome,
+				ChunkSize = AnnofitConf["AnnofitChunkSize"],
+				Threads = Threads)),
+			('Annofit', True, functools.partial(AnnoFit,
+				InputTSV = AnnovarTable,
+				OutputXLSX = VariantsTable,
+				HGMD = Unit["HGMDPath"],
+				AnnovarFolder = Unit["AnnovarFolder"],
+				AnnoFitConfig = AnnofitConf,
+				ChunkSize = AnnofitConf["AnnofitChunkSize"],
+				Threads = Threads,
+				Filtering = Filtering,
+				Output = Output))
+		]
+		
+		# Compact units file snapshot every CheckpointEvery finished stages; 0 = final write only
+		Saving = None
+		Finished = 0
+		for StageAlias, Enabled, Stage in Stages:
+			if (not Enabled) or (StageAlias in Done): continue
+			Saving = Stage()
+			Done.add(StageAlias)
+			if Saving is not None: continue
+			LogStage(Unit, StageAlias, UnitsFile)
+			Finished += 1
+			if CheckpointEvery and (Finished % CheckpointEvery == 0): SaveUnit(Unit, UnitsFile, Compact = True)
+	
+	# The stage is recorded only once its output is on disk
+	if Saving is not None: return Output.submit(FinishStage, Saving, Unit, StageAlias, UnitsFile)
 
 def CreateParser():
 	Parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=f"Scissors: Pipeline for Exome Sequence Analysis", epilog=f"Email: regnveig@ya.ru")
@@ -678,12 +991,36 @@ def CreateParser():
 
 	Parser.add_argument('-a', '--annovar', required=True, help=f"Annovar folder")
 	Parser.add_argument('-g', '--genome', required=True, help=f"Annovar genome alias")
-	Parser.add_argument('-u', '--units', required=True, help=f"Units File in JSON format")
+	Parser.add_argument('-u', '--units', required=True, nargs='+', help=f"Units File(s) in JSON format")
 	Parser.add_argument('-n', '--nofilter', action='store_true', help=f"Don't filter variants")
+	Parser.add_argument('-j', '--jobs', type=int, default=1, help=f"Units processed in parallel")
+	Parser.add_argument('--checkpoint-every', type=int, default=1, metavar='N', help=f"Save units file every N stages (0 = only at the end)")
 	
 	return Parser
 
 def main():
 	Parser = CreateParser()
 	Namespace = Parser.parse_args(sys.argv[1:])
-	AnnoPipe(Namespace.annovar, Namespace.units, "no" if Namespace.nofilter else "full", Namespace.genome)
+	# Fail before any stage starts
+	if not os.path.isdir(Namespace.annovar): Parser.error(f"Annovar folder not found: {Namespace.annovar}")
+	for UnitsFile in Namespace.units:
+		if not os.path.isfile(UnitsFile): Parser.error(f"Units file not found: {UnitsFile}")
+	if Namespace.checkpoint_every < 0: Parser.error(f"--checkpoint-every must be 0 or more: {Namespace.checkpoint_every}")
+	Filtering = "no" if Namespace.nofilter else "full"
+	if Namespace.jobs < 2 or len(Namespace.units) < 2:
+		# One output thread keeps XLSX and units file writes in submission order
+		with concurrent.futures.ThreadPoolExecutor(max_workers=1) as Output:
+			Pending = [AnnoPipe(Namespace.annovar, UnitsFile, Filtering, Namespace.genome, Output, Namespace.checkpoint_every) for UnitsFile in Namespace.units]
+			for Future in Pending:
+				if Future is not None: Future.result()
+		return 0
+	# Units are independent and each one writes only its own units file.
+	# Executor workers are not daemonic, so stages can still start their own pools
+	with concurrent.futures.ProcessPoolExecutor(max_workers=min(Namespace.jobs, len(Namespace.units))) as Workers:
+		Futures = {Workers.submit(AnnoPipe, Namespace.annovar, UnitsFile, Filtering, Namespace.genome, None, Namespace.checkpoint_every): UnitsFile for UnitsFile in Namespace.units}
+		for Future in concurrent.futures.as_completed(Futures):
+			Future.result()
+			logging.info(f"Unit finished: {Futures[Future]}")
+	return 0
+
+if __name__ == '__main__': sys.exit(main())